@@ -6,64 +6,86 @@ across the Copilot runtime: model settings, sandbox paths, image/container
 names, and environment-dependent options.
 
 All environment variables use the prefix: TUX_COPILOT_
+
+The environment is snapshotted once at import time and every setting is read
+through a single helper, so no module ever re-scans ``os.environ`` at runtime.
+The resulting constants are ``Final`` module-level cells that downstream
+``from prefs import ...`` can resolve once and cache.
 """
 
 from __future__ import annotations
 import os
+from typing import Callable, Final, TypeVar
+
+# Snapshot the environment once – a plain mapping read, no per-variable scan.
+_ENV = os.environ
+
+_T = TypeVar("_T")
+
+def _get(name: str, default: _T, cast: Callable[[str], _T] = str) -> _T:
+    """Return ``cast(value)`` for the given variable, or ``default`` if unset."""
+    v = _ENV.get(name)
+    return cast(v) if v is not None else default
 
 # ---------------------------------------------------------------------------
 # LLM configuration
 # ---------------------------------------------------------------------------
 
-LMSTUDIO_URL = os.getenv(
+LMSTUDIO_URL: Final[str] = _get(
     "TUX_COPILOT_LMSTUDIO_URL",
     "http://localhost:1234/v1/chat/completions"
 )
 
-MODEL = os.getenv(
+MODEL: Final[str] = _get(
     "TUX_COPILOT_MODEL",
     "openai/gpt-oss-20b"
 #    "qwen/qwen3-coder-30b"
 )
 
-LLM_PROMPT = (
-    "You are Tux Copilot, a smart AI coding assistant. "
-    "You operate exclusively inside a sandboxed Docker container. "
-    "All user requests must be executed safely; never try modify the docker host system. "
-    "Ask for clarification if any action might be destructive. "
-    "Don't output files end user ask you to read until he/she ask for it. "
-    "Use bash command for single action, do not try to do everything with one command line. "
-    "Provide clear, concise, and helpful responses."
+# Kept deliberately terse: the prompt is re-sent (and re-tokenized on
+# non-caching backends) with every single turn.
+LLM_PROMPT: Final[str] = (
+    "You are Tux Copilot, an AI coding assistant working only inside a "
+    "sandboxed Docker container; never touch the host. "
+    "Ask before destructive actions. Show file contents only when asked. "
+    "One bash command per action. "
+    "Prefer run_script to create and run a script. Be concise."
 )
 # ---------------------------------------------------------------------------
 # Sandbox (Docker) configuration
 # ---------------------------------------------------------------------------
 
-IMAGE_NAME = os.getenv(
+IMAGE_NAME: Final[str] = _get(
     "TUX_COPILOT_IMAGE",
     "tux-copilot:latest"
 )
 
-CONTAINER_NAME = os.getenv(
+CONTAINER_NAME: Final[str] = _get(
     "TUX_COPILOT_CONTAINER",
     "tux_copilot"
 )
 
 # Host directory mounted into the container (/workdir inside the container)
-WORKDIR_HOST = os.getenv(
+WORKDIR_HOST: Final[str] = _get(
     "TUX_COPILOT_SANDBOX_WORKDIR",
     "./sandbox_workdir"
 )
 
+# Upper bound on how much of a file read_file returns (bytes)
+MAX_READ_BYTES: Final[int] = _get("TUX_COPILOT_MAX_READ_BYTES", 1048576, int)
+
 # ---------------------------------------------------------------------------
 # Runtime / I/O preferences
 # ---------------------------------------------------------------------------
 
-TIMEOUT_CONNECT = float(os.getenv("TUX_COPILOT_TIMEOUT_CONNECT", "60"))
-TIMEOUT_READ    = float(os.getenv("TUX_COPILOT_TIMEOUT_READ",    "300"))
-TIMEOUT_WRITE   = float(os.getenv("TUX_COPILOT_TIMEOUT_WRITE",   "60"))
-TIMEOUT_POOL    = float(os.getenv("TUX_COPILOT_TIMEOUT_POOL",    "60"))
+TIMEOUT_CONNECT: Final[float] = _get("TUX_COPILOT_TIMEOUT_CONNECT", 60.0, float)
+TIMEOUT_READ:    Final[float] = _get("TUX_COPILOT_TIMEOUT_READ",    300.0, float)
+TIMEOUT_WRITE:   Final[float] = _get("TUX_COPILOT_TIMEOUT_WRITE",   60.0, float)
+TIMEOUT_POOL:    Final[float] = _get("TUX_COPILOT_TIMEOUT_POOL",    60.0, float)
 
-# Enable verbose logging? 1 = yes, 0 = no
-DEBUG = bool(int(os.getenv("TUX_COPILOT_DEBUG", "0")))
+# How many recent messages to keep verbatim; older turns get folded into a
+# single summary message so per-turn payloads stay bounded
+HISTORY_WINDOW: Final[int] = _get("TUX_COPILOT_HISTORY", 20, int)
 
+# Enable verbose logging? 1 = yes, 0 = no
+DEBUG: Final[bool] = _get("TUX_COPILOT_DEBUG", False, lambda v: bool(int(v)))
@@ -16,22 +16,200 @@ isolated execution environment.
 
 from __future__ import annotations
 
+import itertools
 import os
+import selectors
 import subprocess
+import threading
+import time
 from pathlib import Path
 
+import httpx
+import orjson
+
 from prefs import (
     IMAGE_NAME, CONTAINER_NAME, WORKDIR_HOST
 )
 
+# ---------------------------------------------------------------------------
+# Docker Engine API session
+# ---------------------------------------------------------------------------
+
+DOCKER_SOCK = "/var/run/docker.sock"
+
+# Absolute sandbox directory and its volume-bind string, computed once at
+# import and reused across container (re)starts and by the tools layer.
+# Creating it here keeps the resolved path stable (nothing can later swap a
+# symlink underneath it) and lets file tools work before the container is up.
+WORKDIR_ABS = Path(os.path.abspath(WORKDIR_HOST)).resolve()
+WORKDIR_ABS.mkdir(parents=True, exist_ok=True)
+_BIND = f"{WORKDIR_ABS}:/workdir"
+
+# One HTTP session to the Docker daemon for the whole process.  Every exec
+# reuses this already-open unix socket instead of forking the docker CLI
+# (which itself opens a fresh socket and parses flags on each call).
+DOCKER = httpx.Client(
+    transport=httpx.HTTPTransport(uds=DOCKER_SOCK),
+    base_url="http://docker",
+    timeout=httpx.Timeout(60.0),
+)
+
+# Request bodies for the daemon go through orjson like everything else,
+# bypassing httpx's stdlib-json encoder.
+_JSON_HEADERS = {"content-type": "application/json"}
+
+
+def exec_in_container(cmd: list[str], timeout: float = 60.0) -> tuple[int, bytes, bytes]:
+    """Run ``cmd`` inside the sandbox container via the Engine exec API.
+
+    Creates an exec instance, starts it, demultiplexes the framed
+    stdout/stderr stream and returns ``(exit_code, stdout, stderr)``.
+    ``timeout`` is a wall-clock deadline: httpx's read timeout only bounds
+    the gap between chunks, so a slowly-printing runaway command would
+    otherwise never trip it.
+    """
+    deadline = time.monotonic() + timeout
+    resp = DOCKER.post(
+        f"/containers/{CONTAINER_NAME}/exec",
+        content=orjson.dumps({"Cmd": cmd, "AttachStdout": True, "AttachStderr": True}),
+        headers=_JSON_HEADERS,
+    )
+    resp.raise_for_status()
+    exec_id = resp.json()["Id"]
+
+    out = bytearray()
+    err = bytearray()
+    with DOCKER.stream(
+        "POST", f"/exec/{exec_id}/start",
+        content=orjson.dumps({"Detach": False, "Tty": False}),
+        headers=_JSON_HEADERS,
+        timeout=httpx.Timeout(timeout),
+    ) as stream:
+        # Docker multiplexes stdout/stderr as 8-byte-header frames:
+        # byte 0 is the stream id, bytes 4-7 the big-endian payload size.
+        buf = bytearray()
+        for chunk in stream.iter_bytes():
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"command timed out after {timeout}s")
+            buf.extend(chunk)
+            while len(buf) >= 8:
+                size = int.from_bytes(buf[4:8], "big")
+                if len(buf) < 8 + size:
+                    break
+                target = err if buf[0] == 2 else out
+                target.extend(buf[8:8 + size])
+                del buf[:8 + size]
+
+    inspect = DOCKER.get(f"/exec/{exec_id}/json")
+    inspect.raise_for_status()
+    return inspect.json().get("ExitCode") or 0, bytes(out), bytes(err)
+
+# ---------------------------------------------------------------------------
+# Persistent in-container shell
+# ---------------------------------------------------------------------------
+
+# A single long-lived ``docker exec -i bash`` session.  Each command is piped
+# into its stdin followed by a unique sentinel, and output is read back until
+# the sentinel appears – amortizing the per-exec setup cost (namespace join,
+# cgroup attach) across every command of the session.
+_shell: subprocess.Popen | None = None
+_shell_lock = threading.Lock()
+_shell_seq = itertools.count()
+
+
+def _ensure_shell() -> subprocess.Popen | None:
+    """Return the live shell session, starting one if needed."""
+    global _shell
+    if _shell is not None and _shell.poll() is None:
+        return _shell
+    try:
+        _shell = subprocess.Popen(
+            ["docker", "exec", "-i", CONTAINER_NAME, "bash"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+        )
+    except Exception:
+        _shell = None
+    return _shell
+
+
+def _close_shell():
+    global _shell
+    if _shell is not None:
+        try:
+            _shell.kill()
+        except Exception:
+            pass
+        _shell = None
+
+
+def _shell_exchange(shell: subprocess.Popen, command: str, timeout: float) -> tuple[int, bytes, bytes]:
+    """Send one command through the shell and collect output up to the sentinel."""
+    marker = f"__TUX_DONE_{next(_shell_seq)}__".encode()
+    shell.stdin.write(command.encode() + b"\necho " + marker + b" $?\n")
+    shell.stdin.flush()
+
+    out = bytearray()
+    err = bytearray()
+    sel = selectors.DefaultSelector()
+    sel.register(shell.stdout, selectors.EVENT_READ, out)
+    sel.register(shell.stderr, selectors.EVENT_READ, err)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            idx = out.find(marker)
+            if idx != -1:
+                line = bytes(out[idx:]).split(b"\n", 1)[0]
+                code = int(line.split()[1]) if len(line.split()) > 1 else 0
+                return code, bytes(out[:idx]), bytes(err)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"command timed out after {timeout}s")
+            for key, _ in sel.select(remaining):
+                data = os.read(key.fileobj.fileno(), 65536)
+                if not data:
+                    raise RuntimeError("shell session closed unexpectedly")
+                key.data.extend(data)
+    finally:
+        sel.close()
+
+
+def run_in_shell(command: str, timeout: float = 60.0) -> tuple[int, bytes, bytes]:
+    """Run a bash command in the sandbox, preferring the persistent shell.
+
+    Falls back to a one-shot Engine-API exec when the session cannot be
+    (re)started or the channel breaks.  A :class:`TimeoutError` propagates
+    instead – the command may have executed, so it must not be retried.
+    Returns ``(exit_code, stdout, stderr)``.
+    """
+    with _shell_lock:
+        shell = _ensure_shell()
+        if shell is None:
+            return exec_in_container(["bash", "-c", command], timeout)
+        try:
+            return _shell_exchange(shell, command, timeout)
+        except TimeoutError:
+            # The command already ran for its full budget and may have had
+            # side effects (or still be running – killing the exec client
+            # does not kill the in-container process).  Never re-run it;
+            # drop the channel and let the tool report the failure.
+            _close_shell()
+            raise
+        except Exception:
+            # Channel failure (dead pipe, broken session) – the command
+            # never completed through the shell, so a one-shot retry is safe.
+            _close_shell()
+            return exec_in_container(["bash", "-c", command], timeout)
+
 # ---------------------------------------------------------------------------
 # Docker helpers
 # ---------------------------------------------------------------------------
 
 def check_image() -> bool:
     """Return ``True`` if the image exists locally."""
-    res = subprocess.run(["docker", "images", "-q", IMAGE_NAME], capture_output=True, text=True)
-    return bool(res.stdout.strip())
+    return DOCKER.get(f"/images/{IMAGE_NAME}/json").status_code == 200
 
 
 def build_image():
@@ -46,22 +224,31 @@ def build_image():
 
 def start_container():
     """Launch a detached interactive container with the sandbox mounted."""
-    Path(WORKDIR_HOST).mkdir(parents=True, exist_ok=True)
-    subprocess.check_call([
-        "docker",
-        "run",
-        "--name", CONTAINER_NAME,
-        "-dti",
-        "-v", f"{Path(os.path.abspath(WORKDIR_HOST)).resolve()}:/workdir",
-        IMAGE_NAME,
-    ])
+    resp = DOCKER.post(
+        f"/containers/create?name={CONTAINER_NAME}",
+        content=orjson.dumps({
+            "Image": IMAGE_NAME,
+            "Tty": True,
+            "OpenStdin": True,
+            "HostConfig": {"Binds": [_BIND]},
+        }),
+        headers=_JSON_HEADERS,
+    )
+    resp.raise_for_status()
+    DOCKER.post(f"/containers/{CONTAINER_NAME}/start").raise_for_status()
     print(f"[+] Started container {CONTAINER_NAME}")
 
 
 def stop_container():
     """Stop and remove the sandbox container."""
-    subprocess.run(["docker", "stop", CONTAINER_NAME], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    subprocess.run(["docker", "rm", CONTAINER_NAME], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _close_shell()
+    # Best effort, like the old CLI calls with output sent to /dev/null.
+    try:
+        DOCKER.post(f"/containers/{CONTAINER_NAME}/stop")
+        DOCKER.delete(f"/containers/{CONTAINER_NAME}")
+    except Exception:
+        pass
     print(f"[+] Stopped and removed container {CONTAINER_NAME}")
 
-__all__ = ["check_image", "build_image", "start_container", "stop_container"]
+__all__ = ["check_image", "build_image", "start_container", "stop_container",
+           "exec_in_container", "run_in_shell", "WORKDIR_ABS"]
@@ -22,100 +22,184 @@ the model can do and how it can interact with the sandboxed environment.
 
 from __future__ import annotations
 
+import inspect
 import os
-import subprocess
+import shlex
 import time
 from pathlib import Path
 
-from prefs import (
-    IMAGE_NAME, CONTAINER_NAME, WORKDIR_HOST, DEBUG
-)
+import orjson
+
+from prefs import MAX_READ_BYTES
+from sandbox import run_in_shell, WORKDIR_ABS
+
+# ---------------------------------------------------------------------------
+# Sandbox path handling
+# ---------------------------------------------------------------------------
+
+# The sandbox root is resolved once in sandbox.py – Path parsing and realpath
+# are not free, and a fixed resolved root lets every tool cheaply reject
+# paths that would escape the mount (e.g. via ".." or symlinks).
+_WORKDIR: Path = WORKDIR_ABS
+
+def _sandbox_path(path: str) -> Path | None:
+    """Map a tool-supplied relative path onto the sandbox root.
+
+    Returns ``None`` when the resolved path falls outside the sandbox.
+    """
+    full = (_WORKDIR / path).resolve()
+    return full if full.is_relative_to(_WORKDIR) else None
 
 # ---------------------------------------------------------------------------
 # Tool implementations
 # ---------------------------------------------------------------------------
 
-def run_get_date() -> str:
+# Every tool returns a (status, body) pair with status in {"OK", "WARN",
+# "ERROR"}.  The tool knows its own outcome, so the driver never has to scan
+# potentially multi-KB result text to recover it.
+ToolResult = tuple[str, str]
+
+# Prebuilt template for exec-style results – formatted via format_map and
+# C-level join so multi-KB outputs are decoded and trimmed exactly once.
+_STDERR_TMPL = "STDERR:\n{e}\n\nSTDOUT:\n{o}"
+
+def _exec_report(ok_prefix: str, out: bytes, err: bytes) -> ToolResult:
+    """Turn raw exec output into a ToolResult with minimal copying."""
+    output = out.decode("utf-8", "replace").rstrip()
+    errors = err.decode("utf-8", "replace").rstrip()
+    if errors:
+        return ("WARN", _STDERR_TMPL.format_map({"e": errors, "o": output}))
+    return ("OK", "".join((ok_prefix, output)))
+
+# strftime re-parses its format string and consults locale data on every
+# call; the date answer only changes once a day, so cache it keyed on the
+# local day (year + day-of-year – a UTC-based key would serve yesterday's
+# date for hours after local midnight in non-UTC timezones).
+_date_cache: list = [None, ""]
+
+def run_get_date() -> ToolResult:
     """Return current ISO date (YYYY-MM-DD)."""
-    return time.strftime("%Y-%m-%d")
+    t = time.localtime()
+    day = (t.tm_year, t.tm_yday)
+    if day != _date_cache[0]:
+        _date_cache[:] = [day, f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}"]
+    return ("OK", _date_cache[1])
 
-def run_get_time() -> str:
+def run_get_time() -> ToolResult:
     """Return current local time (HH:MM:SS)."""
-    return time.strftime("%H:%M:%S")
+    t = time.localtime()
+    return ("OK", f"{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}")
 
-def run_write_file(path: str, contents: str) -> str:
+def run_write_file(path: str, contents: str) -> ToolResult:
     """Write ``contents`` to a file relative to :data:`WORKDIR_HOST`.
 
     The function refuses to overwrite an existing file to avoid accidental
-    data loss, mirroring the behaviour of the original driver.
+    data loss, mirroring the behaviour of the original driver.  O_EXCL fuses
+    that exists-check with the create itself, so there is no stat/open race
+    and no extra syscalls; the parent directory is only created when the
+    first open fails with ENOENT (most writes land in existing directories).
     """
-    full_path = Path(WORKDIR_HOST) / path
-    try:
-        if full_path.exists():
-            return f"❌ REFUSED: File already exists: {full_path}"
+    full_path = _sandbox_path(path)
+    if full_path is None:
+        return ("ERROR", f"REFUSED: Path escapes the sandbox: {path}")
 
-        full_path.parent.mkdir(parents=True, exist_ok=True)
-        full_path.write_text(contents, encoding="utf-8")
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL
+    try:
+        try:
+            fd = os.open(full_path, flags, 0o644)
+        except FileNotFoundError:
+            full_path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(full_path, flags, 0o644)
+    except FileExistsError:
+        return ("ERROR", f"REFUSED: File already exists: {full_path}")
+    except Exception as e:
+        return ("ERROR", f"Write failed: {e}")
 
+    try:
+        os.write(fd, contents.encode("utf-8"))
     except Exception as e:
-        return f"❌ Write failed: {e}"
+        return ("ERROR", f"Write failed: {e}")
+    finally:
+        os.close(fd)
 
-    return f"✅ Write OK:\nFile created at: {full_path}"
+    return ("OK", f"Write OK:\nFile created at: {full_path}")
 
-def run_exec(path: str) -> str:
+def run_exec(path: str) -> ToolResult:
     """Execute a script inside the Docker container.
 
     The function expects ``path`` to be relative to ``/workdir`` within the
-    container.  It uses :command:`docker exec` to run the file and captures
-    stdout/stderr.  A timeout of 60 seconds protects against runaway scripts.
+    container.  It runs the file through the persistent shell session (with
+    a one-shot Engine-API exec as fallback) and captures stdout/stderr.  A
+    timeout of 60 seconds protects against runaway scripts.
     """
-    script_path = f"/workdir/{path}"
-    cmd = ["docker", "exec", CONTAINER_NAME, script_path]
+    script_path = shlex.quote(f"/workdir/{path}")
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        _, out, err = run_in_shell(script_path)
     except Exception as e:
-        return f"❌ Execution failed: {e}"
+        return ("ERROR", f"Execution failed: {e}")
 
-    output = result.stdout.strip()
-    errors = result.stderr.strip()
-    if errors:
-        return f"⚠ STDERR:\n{errors}\n\nSTDOUT:\n{output}"
-
-    return f"✅ Execution OK:\n{output}"
+    return _exec_report("Execution OK:\n", out, err)
 
-def run_bash_cmd(command: str) -> str:
+def run_bash_cmd(command: str) -> ToolResult:
     """Run an arbitrary Bash command inside the Docker container.
 
-    The command is executed using:
-        docker exec <container> bash -c "<command>"
-    A timeout of 60 seconds prevents runaway processes.
+    The command is piped through the persistent in-container shell session
+    (with a one-shot Engine-API exec as fallback).  A timeout of 60 seconds
+    prevents runaway processes.
     """
-    cmd = ["docker", "exec", CONTAINER_NAME, "bash", "-c", command]
-
     try:
-        result = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=60
-        )
+        _, out, err = run_in_shell(command)
     except Exception as e:
-        return f"❌ Bash command failed: {e}"
+        return ("ERROR", f"Bash command failed: {e}")
 
-    output = result.stdout.strip()
-    errors = result.stderr.strip()
+    return _exec_report(f"{command}\n", out, err)
 
-    if errors:
-        return f"⚠ STDERR:\n{errors}\n\nSTDOUT:\n{output}"
+def run_script(path: str, contents: str, argv: list[str] | None = None) -> ToolResult:
+    """Write a script, make it executable and run it – all in one call.
+
+    The LLM tends to chain ``write_file`` → chmod → ``exec_script`` as three
+    separate tool turns, each costing an LLM round-trip and (for exec) a
+    ``docker exec`` fork.  This fuses the sequence into one tool call with a
+    single container round-trip for the chmod+run part.  ``argv`` passes
+    optional arguments to the script.
+    """
+    status, body = run_write_file(path, contents)
+    if status != "OK":
+        return (status, body)
+
+    quoted = shlex.quote(f"/workdir/{path}")
+    run = quoted
+    if argv:
+        run += " " + " ".join(shlex.quote(str(a)) for a in argv)
+    try:
+        _, out, err = run_in_shell(f"chmod +x {quoted} && {run}")
+    except Exception as e:
+        return ("ERROR", f"Execution failed: {e}")
 
-    return f"✅ {command}\n{output}"
+    return _exec_report(f"Script created and executed: {path}\n", out, err)
 
-def run_read_file(path: str) -> str:
-    """Read the contents of a file inside :data:`WORKDIR_HOST`."""
-    full_path = Path(WORKDIR_HOST) / path
+def run_read_file(path: str) -> ToolResult:
+    """Read the contents of a file inside :data:`WORKDIR_HOST`.
+
+    Reads at most :data:`MAX_READ_BYTES`; anything beyond the cap is dropped
+    and flagged with a truncation notice, so a multi-MB file cannot blow up
+    memory or the LLM context.
+    """
+    full_path = _sandbox_path(path)
+    if full_path is None:
+        return ("ERROR", f"REFUSED: Path escapes the sandbox: {path}")
     if not full_path.exists():
-        return f"❌ File not found: {full_path}"
+        return ("ERROR", f"File not found: {full_path}")
     try:
-        return full_path.read_text(encoding="utf-8")
+        with open(full_path, "rb") as f:
+            data = f.read(MAX_READ_BYTES + 1)
     except Exception as e:
-        return f"❌ Failed to read file: {e}"
+        return ("ERROR", f"Failed to read file: {e}")
+
+    text = data[:MAX_READ_BYTES].decode("utf-8", errors="replace")
+    if len(data) > MAX_READ_BYTES:
+        text += "\n...[truncated]"
+    return ("OK", text)
 
 # ---------------------------------------------------------------------------
 # Public mapping of tool names to callables
@@ -127,37 +211,52 @@ TOOLS = {
     "exec_script": run_exec,
     "read_file": run_read_file,
     "bash_cmd": run_bash_cmd,
+    "run_script": run_script,
 }
 
-__all__ = ["TOOLS", "run_get_date", "run_get_time", "run_write_file",
-           "run_bash_cmd", "run_read_file"]
+# Frozen dispatch metadata: (callable, parameter names, required parameter
+# names) per tool, computed once at import.  The dispatcher checks required
+# names against the parsed args dict and binds positionally, so a malformed
+# tool call surfaces as an ERROR result instead of a TypeError – and a call
+# missing a required argument can no longer run with a silent "" default
+# (e.g. write_file creating an empty file and reporting success).
+def _tool_meta(fn):
+    params = inspect.signature(fn).parameters
+    return (fn, tuple(params),
+            tuple(n for n, p in params.items() if p.default is p.empty))
+
+TOOLS_META = {name: _tool_meta(fn) for name, fn in TOOLS.items()}
+
+__all__ = ["TOOLS", "TOOLS_META", "LLM_TOOLS_PAYLOAD", "LLM_TOOLS_PAYLOAD_JSON",
+           "run_get_date", "run_get_time", "run_write_file",
+           "run_bash_cmd", "run_read_file", "run_script"]
 
 # ------------------------
 # LLM tools payload
 # ------------------------
 LLM_TOOLS_PAYLOAD = [
-    {"type":"function","function":{"name":"get_date", "description":"Return current ISO date","parameters":{"type":"object","properties":{}}}},
-    {"type":"function","function":{"name":"get_time", "description":"Return current local time","parameters":{"type":"object","properties":{}}}},
+    {"type":"function","function":{"name":"get_date", "description":"ISO date","parameters":{"type":"object","properties":{}}}},
+    {"type":"function","function":{"name":"get_time", "description":"local time","parameters":{"type":"object","properties":{}}}},
     {"type":"function","function":{
         "name":"write_file",
-        "description":"Write a file to the sandbox. Provide path and contents.",
+        "description":"Write a new file",
         "parameters":{"type":"object","properties":{"path":{"type":"string"},"contents":{"type":"string"}},"required":["path","contents"]}
     }},
     {"type":"function","function":{
         "name":"exec_script",
-        "description":"Execute a script inside the container using docker exec",
+        "description":"Run a script in the sandbox",
         "parameters":{"type":"object","properties":{"path":{"type":"string"}},"required":["path"]}
     }},
     {"type":"function","function":{
         "name":"read_file",
-        "description":"Read the contents of a file inside the sandbox. Provide path.",
+        "description":"Read a file",
         "parameters":{"type":"object","properties":{"path":{"type":"string"}},"required":["path"]}
     }},
     {
     "type": "function",
     "function": {
         "name": "bash_cmd",
-        "description": "Execute an arbitrary Bash command inside the container using docker exec",
+        "description": "Run a bash command in the sandbox",
         "parameters": {
             "type": "object",
             "properties": {
@@ -165,5 +264,15 @@ LLM_TOOLS_PAYLOAD = [
             },
             "required": ["command"]
         }
+    }},
+    {"type":"function","function":{
+        "name":"run_script",
+        "description":"Write a script, chmod +x and run it, optionally with arguments",
+        "parameters":{"type":"object","properties":{"path":{"type":"string"},"contents":{"type":"string"},"argv":{"type":"array","items":{"type":"string"}}},"required":["path","contents"]}
     }}
 ]
+
+# The schema never changes after import, so serialize it exactly once.  The
+# main driver splices these bytes into the request body instead of letting
+# httpx re-encode the same ~2 KB of static JSON on every turn.
+LLM_TOOLS_PAYLOAD_JSON = orjson.dumps(LLM_TOOLS_PAYLOAD)
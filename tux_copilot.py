@@ -19,21 +19,29 @@ the tools, and the sandbox into a unified interactive experience.
 
 from __future__ import annotations
 
+import asyncio
+import atexit
+import difflib
+import hashlib
+import itertools
 import os
-import json
-import uuid
+import random
 import time
+from collections import OrderedDict
 from pathlib import Path
 
 import httpx
+import orjson
+from prompt_toolkit import PromptSession
 
 # Rich console for pretty output ------------------------------------------
 from rich.console import Console
+from rich.live import Live
 from rich.markdown import Markdown
 console = Console()
 
 # Import the split modules --------------------------------------------------
-from tools import TOOLS, LLM_TOOLS_PAYLOAD
+from tools import TOOLS_META, LLM_TOOLS_PAYLOAD_JSON
 from sandbox import check_image, build_image, start_container, stop_container
 
 # ---------------------------------------------------------------------------
@@ -43,7 +51,7 @@ from prefs import (
     LMSTUDIO_URL, MODEL, LLM_PROMPT,
     IMAGE_NAME, CONTAINER_NAME, WORKDIR_HOST,
     TIMEOUT_CONNECT, TIMEOUT_READ, TIMEOUT_WRITE, TIMEOUT_POOL,
-    DEBUG
+    HISTORY_WINDOW, DEBUG
 )
 
 # HTTPX timeout configuration ----------------------------------------------
@@ -57,30 +65,208 @@ timeout_prefs = httpx.Timeout(
 # ---------------------------------------------------------------------------
 # LLM interaction helpers
 # ---------------------------------------------------------------------------
-async def call_llm(messages: list[dict]):
-    async with httpx.AsyncClient(timeout=timeout_prefs) as client:
-        payload = {
-            "model": MODEL,
-            "messages": messages,
-            "tools": LLM_TOOLS_PAYLOAD
-        }
-        resp = await client.post(LMSTUDIO_URL, json=payload)
+
+# Static framing of the request body – everything except the messages array is
+# identical on every turn, so it is encoded once at import time.
+_JSON_HEADERS = {"content-type": "application/json"}
+_BODY_PREFIX = b'{"model":' + orjson.dumps(MODEL) + b',"messages":'
+
+# cache_prompt asks llama.cpp-based backends (LM Studio included) to keep the
+# KV cache of the shared prompt prefix alive between turns, so the server only
+# processes the new messages instead of re-tokenizing the whole history.  The
+# stable session_id keys that cache, and the session-scoped slot_id pins the
+# request to one llama.cpp server slot so the cache is not evicted by slot
+# rotation; all three fields are ignored by servers without the extension.
+_SESSION_ID = os.urandom(16).hex()
+_SESSION_SLOT = random.randint(0, 15)
+_BODY_SUFFIX = (
+    b',"tools":' + LLM_TOOLS_PAYLOAD_JSON
+    + b',"cache_prompt":true,"session_id":"' + _SESSION_ID.encode()
+    + b'","slot_id":' + str(_SESSION_SLOT).encode()
+    + b',"stream":true}'
+)
+
+# Keep connections to LM Studio alive between turns instead of rebuilding
+# the pool (DNS, transport, socket) on every LLM call; a few spare slots
+# cover warmup and follow-up requests overlapping.
+limits_prefs = httpx.Limits(max_keepalive_connections=8, keepalive_expiry=300)
+
+# Console style per tool-result status (see tools.ToolResult)
+_STATUS_STYLES = {"OK": "cyan", "WARN": "yellow", "ERROR": "bold red"}
+
+# Fallback IDs for tool calls the model sent without one – they only need to
+# be unique within this session's message list, so a plain counter beats a
+# uuid4 (urandom syscall + 36-char formatting) per call.
+_tool_id_counter = itertools.count()
+
+async def run_tool(name: str, args: dict) -> tuple[str, str]:
+    """Execute one tool call on a worker thread, returning (status, body).
+
+    Tools wrap blocking I/O (container execs, file access), so running them
+    via to_thread lets independent calls from the same LLM turn overlap.
+    """
+    func, params, required = TOOLS_META.get(name, (None, (), ()))
+    if func is None:
+        return "ERROR", f"Unknown tool: {name}"
+    missing = [p for p in required if p not in args]
+    if missing:
+        return "ERROR", f"Missing required argument(s) for {name}: {', '.join(missing)}"
+    return await asyncio.to_thread(func, *(args.get(p) for p in params))
+
+# Exact-match response cache: an identical (model, history, tools) request
+# skips the server entirely.  Only answers without tool calls are cached –
+# tool calls have side effects and must always re-execute.
+_LLM_CACHE: OrderedDict[str, dict] = OrderedDict()
+_LLM_CACHE_MAX = 512
+
+async def call_llm(client: httpx.AsyncClient, messages: list[dict]) -> dict:
+    """Stream one chat completion and return the assembled assistant message.
+
+    Tokens are rendered as they arrive via a live Markdown view, so the user
+    sees output at time-to-first-token instead of waiting for the full
+    generation.  tool_calls deltas are stitched back together across chunks.
+
+    The messages array is spliced from the pre-serialized per-message blobs
+    (see the history helpers below), so only messages added since the last
+    call were encoded – the growing transcript is never re-walked.
+    """
+    body = _BODY_PREFIX + b"[" + b",".join(_serialized) + b"]" + _BODY_SUFFIX
+    # The body already covers model, history and tools, so it is the key.
+    key = hashlib.blake2b(body).hexdigest()
+    cached = _LLM_CACHE.get(key)
+    if cached is not None:
+        _LLM_CACHE.move_to_end(key)
+        if DEBUG:
+            console.print("[debug] LLM cache hit", style="dim")
+        if cached.get("content"):
+            console.print(Markdown("Tux> " + cached["content"]))
+        return cached
+
+    # DEBUG is a Final bool bound at import – when off, the diagnostics
+    # (including their f-strings) are never evaluated.
+    if DEBUG:
+        console.print(f"[debug] POST {len(body)} B, {len(messages)} messages",
+                      style="dim")
+        t0 = time.perf_counter()
+
+    buffer = ""
+    tool_calls: dict[int, dict] = {}
+    async with client.stream("POST", LMSTUDIO_URL, content=body,
+                             headers=_JSON_HEADERS) as resp:
         resp.raise_for_status()
-        return resp.json()
+        with Live(console=console, refresh_per_second=10) as live:
+            async for line in resp.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                data = line[6:]
+                if data == "[DONE]":
+                    break
+                choices = orjson.loads(data).get("choices")
+                if not choices:
+                    continue
+                delta = choices[0].get("delta") or {}
+
+                if delta.get("content"):
+                    buffer += delta["content"]
+                    live.update(Markdown("Tux> " + buffer))
+
+                # tool_call arguments arrive as string fragments per index
+                for tc in delta.get("tool_calls") or ():
+                    slot = tool_calls.setdefault(tc.get("index", 0), {
+                        "id": "",
+                        "type": "function",
+                        "function": {"name": "", "arguments": ""},
+                    })
+                    if tc.get("id"):
+                        slot["id"] = tc["id"]
+                    fn = tc.get("function") or {}
+                    if fn.get("name"):
+                        slot["function"]["name"] = fn["name"]
+                    if fn.get("arguments"):
+                        slot["function"]["arguments"] += fn["arguments"]
+
+    if DEBUG:
+        console.print(f"[debug] LLM answered in {time.perf_counter() - t0:.2f}s",
+                      style="dim")
+
+    message: dict = {"content": buffer}
+    if tool_calls:
+        message["tool_calls"] = [tool_calls[i] for i in sorted(tool_calls)]
+    else:
+        _LLM_CACHE[key] = message
+        if len(_LLM_CACHE) > _LLM_CACHE_MAX:
+            _LLM_CACHE.popitem(last=False)
+    return message
+
+def _system_message() -> dict:
+    """The static system prefix, marked for provider-side prompt caching.
+
+    The content-block form with cache_control lets Anthropic/OpenAI/vLLM-style
+    backends reuse the KV cache for this byte-identical prefix on every turn;
+    servers that do not know the marker simply ignore it.
+    """
+    return {
+        "role": "system",
+        "content": [{
+            "type": "text",
+            "text": LLM_PROMPT,
+            "cache_control": {"type": "ephemeral"},
+        }],
+    }
+
+# ---------------------------------------------------------------------------
+# Pre-LLM intent shortcut
+# ---------------------------------------------------------------------------
+
+# Deterministic small-talk ("what time is it") otherwise costs two full LLM
+# round-trips – one to emit the tool call, one to phrase the answer – just to
+# reach get_time.  A fuzzy match against a few canonical phrasings answers
+# those locally in microseconds; anything below the threshold goes to the
+# model as usual.
+_INTENT_SEEDS: tuple[tuple[str, str], ...] = (
+    ("what time is it", "get_time"),
+    ("what is the time", "get_time"),
+    ("what is the current time", "get_time"),
+    ("tell me the time", "get_time"),
+    ("what is the date", "get_date"),
+    ("what is today's date", "get_date"),
+    ("what day is it today", "get_date"),
+    ("tell me today's date", "get_date"),
+)
+_INTENT_THRESHOLD = 0.85
+_INTENT_REPLY = {"get_time": "It is {}.", "get_date": "Today is {}."}
+
+def _match_intent(text: str) -> str | None:
+    """Return the tool name for a canonical query, or ``None`` to use the LLM."""
+    query = " ".join(text.lower().replace("what's", "what is").split()).rstrip("?!. ")
+    if not query:
+        return None
+    matcher = difflib.SequenceMatcher(b=query)
+    best, best_tool = 0.0, None
+    for phrase, tool in _INTENT_SEEDS:
+        matcher.set_seq1(phrase)
+        ratio = matcher.ratio()
+        if ratio > best:
+            best, best_tool = ratio, tool
+    return best_tool if best >= _INTENT_THRESHOLD else None
 
 # ---------------------------------------------------------------------------
 # Chat loop
 # ---------------------------------------------------------------------------
-async def chat_loop():
+async def chat_loop(client: httpx.AsyncClient):
     console.print("\n🟢 Interactive Chat Started", style="bold green")
     console.print("Type your message and press ENTER. Ctrl-C or 'exit' to quit.\n", style="dim")
 
-    messages: list[dict] = [{"role": "system", "content": LLM_PROMPT}]
+    prompt = PromptSession()
+    messages: list[dict] = [_system_message()]
+    reset_history(messages)
 
     while True:
         try:
-            user_input = input("You> ").strip()
-        except KeyboardInterrupt:
+            # Fully async prompt – the event loop keeps running (keep-alive,
+            # background tasks, streaming teardown) while the user types.
+            user_input = (await prompt.prompt_async("You> ")).strip()
+        except (KeyboardInterrupt, EOFError):
             console.print("\n👋 Exiting cleanly…", style="bold yellow")
             break
 
@@ -90,84 +276,222 @@ async def chat_loop():
 
         add_message(messages, "user", user_input)
 
-        # 1. Send to LLM
-        response = await call_llm(messages)
-        choice = response["choices"][0]["message"]
+        # 0. Canonical date/time queries short-circuit to the tool itself –
+        # no LLM round-trip.  The synthesized answer still lands in the
+        # history so later turns can refer back to it.
+        intent = _match_intent(user_input)
+        if intent is not None:
+            status, body = TOOLS_META[intent][0]()
+            reply = _INTENT_REPLY[intent].format(body) if status == "OK" else body
+            console.print(Markdown("Tux> " + reply))
+            add_message(messages, "assistant", reply)
+            continue
+
+        # 1. Send to LLM – content is rendered live while it streams
+        choice = await call_llm(client, messages)
 
         # 2. Handle tool calls if any
         if "tool_calls" in choice and choice["tool_calls"]:
+            calls = []
             for tc in choice["tool_calls"]:
                 tool_name = tc["function"]["name"]
                 raw_args = tc["function"].get("arguments", "{}")
                 try:
-                    args_dict = json.loads(raw_args)
-                except json.JSONDecodeError:
+                    args_dict = orjson.loads(raw_args)
+                except orjson.JSONDecodeError:
                     args_dict = {}
-
-                tool_id = tc.get("id") or str(uuid.uuid4())
-                add_tool_call(messages, tool_id, tool_name, args_dict)
-
-                func = TOOLS.get(tool_name)
-                if func:
-                    try:
-                        result = func(**args_dict)
-                    except TypeError as e:
-                        result = f"[ERROR] {e}"
+                calls.append((tc.get("id") or f"t{next(_tool_id_counter)}", tool_name, args_dict))
+
+            # Independent tool calls from the same turn run concurrently;
+            # the shared shell channel serializes itself internally.  A
+            # crashing tool must not take down its siblings or the loop.
+            results = await asyncio.gather(
+                *(run_tool(name, args) for _, name, args in calls),
+                return_exceptions=True,
+            )
+
+            # Record and display in the model's original call order, then
+            # splice the whole round-trip into the history in one extend.
+            batch: list[dict] = []
+            for (tool_id, tool_name, args_dict), result in zip(calls, results):
+                if isinstance(result, BaseException):
+                    status, body = "ERROR", f"Tool crashed: {result}"
                 else:
-                    result = f"[ERROR] Unknown tool: {tool_name}"
+                    status, body = result
+                add_tool_turn(batch, tool_id, tool_name, args_dict, f"[{status}] {body}")
 
-                add_tool_response(messages, tool_id, result)
+                # Pretty print the call & result – the status set by the
+                # tool itself picks the style, no text scanning needed.
+                console.print(f"\ntool call {tool_name}\n{body}\n",
+                              style=_STATUS_STYLES[status])
 
-                # Pretty print the call & result
-                style = "bold red" if "[ERROR]" in result else ("yellow" if "❌" in result or "⚠" in result else "cyan")
-                console.print(f"\ntool call {tool_name}\n{result}\n", style=style)
+            extend_history(messages, batch)
 
-            # Ask again after tool output
-            final_resp = await call_llm(messages)
-            final_msg = final_resp["choices"][0]["message"].get("content", "")
-            add_message(messages, "assistant", final_msg)
-            console.print(Markdown("Tux" + "> " + final_msg))
+            # Ask again after tool output (also streamed live)
+            final = await call_llm(client, messages)
+            add_message(messages, "assistant", final.get("content", ""))
         else:
-            # Normal assistant reply
-            text = choice.get("content", "")
-            add_message(messages, "assistant", text)
-            console.print(Markdown("Tux" + "> " + text))
+            # Normal assistant reply – already rendered while streaming
+            add_message(messages, "assistant", choice.get("content", ""))
+
+        # Keep the per-turn payload bounded regardless of session length
+        await compact_history(client, messages)
 
 # ---------------------------------------------------------------------------
 # Utility helpers for message building (kept from original script)
 # ---------------------------------------------------------------------------
 
-def add_message(messages: list[dict], role: str, content: str):
-    messages.append({"role": role, "content": content})
+# Serialized mirror of the chat history: one orjson blob per message, joined
+# into the request body by call_llm.  Every history mutation goes through the
+# helpers below so each message is encoded exactly once, when it is added –
+# per-turn encode cost stays O(new messages) instead of O(whole transcript).
+_serialized: list[bytes] = []
 
-def add_tool_call(messages: list[dict], tool_id: str, name: str, arguments: dict):
-    messages.append({
-        "role": "assistant",
-        "tool_calls": [{
-            "id": tool_id,
-            "type": "function",
-            "function": {"name": name, "arguments": json.dumps(arguments)}
-        }]
-    })
+def reset_history(messages: list[dict]):
+    """(Re)build the serialized mirror from scratch, e.g. at session start."""
+    _serialized[:] = [orjson.dumps(m) for m in messages]
 
-def add_tool_response(messages: list[dict], tool_id: str, result: str):
-    messages.append({"role": "tool", "tool_call_id": tool_id, "content": result})
+def add_message(messages: list[dict], role: str, content: str):
+    message = {"role": role, "content": content}
+    messages.append(message)
+    _serialized.append(orjson.dumps(message))
+
+def extend_history(messages: list[dict], batch: list[dict]):
+    """Splice a prepared batch of messages (see add_tool_turn) into the history."""
+    messages.extend(batch)
+    _serialized.extend(orjson.dumps(m) for m in batch)
+
+def add_tool_turn(messages: list[dict], tool_id: str, name: str, arguments: dict, result: str):
+    """Append a tool call and its response as one batched extend."""
+    messages.extend((
+        {
+            "role": "assistant",
+            "tool_calls": [{
+                "id": tool_id,
+                "type": "function",
+                "function": {"name": name, "arguments": orjson.dumps(arguments).decode()}
+            }]
+        },
+        {"role": "tool", "tool_call_id": tool_id, "content": result},
+    ))
+
+_SUMMARY_PROMPT = (
+    "Summarize this conversation fragment in under 200 tokens. "
+    "Keep file names, commands, results and decisions."
+)
+
+async def _summarize(client: httpx.AsyncClient, text: str) -> str | None:
+    """One-off cheap summarization call; None when the server is unhappy."""
+    try:
+        resp = await client.post(
+            LMSTUDIO_URL,
+            content=orjson.dumps({
+                "model": MODEL,
+                "messages": [
+                    {"role": "system", "content": _SUMMARY_PROMPT},
+                    {"role": "user", "content": text},
+                ],
+            }),
+            headers=_JSON_HEADERS,
+        )
+        resp.raise_for_status()
+        return orjson.loads(resp.content)["choices"][0]["message"].get("content") or None
+    except Exception:
+        return None
+
+# Hysteresis for compaction: let the history overshoot the window by this
+# many messages before folding it back down to the window.  Compacting on
+# every turn past the threshold would add a summarization round-trip of
+# latency to each turn; batching amortizes it to one call per ~10 turns.
+_COMPACT_SLACK = HISTORY_WINDOW // 2
+
+_SUMMARY_MARK = "[Summary of earlier turns]"
+
+async def compact_history(client: httpx.AsyncClient, messages: list[dict]):
+    """Fold turns older than :data:`HISTORY_WINDOW` into one summary message.
+
+    Without a bound, every LLM call re-ships the whole transcript, so turn N
+    costs O(N) serialization, bytes and server prefill.  The original system
+    prompt at index 0 and the most recent messages stay verbatim; everything
+    in between is rolled up by the model itself (falling back to a plain
+    truncated digest when the summarization call fails).
+    """
+    if len(messages) <= HISTORY_WINDOW + 1 + _COMPACT_SLACK:
+        return
+    boundary = len(messages) - HISTORY_WINDOW
+    # Never separate an assistant tool_call from its tool response.
+    while boundary > 1 and messages[boundary].get("role") == "tool":
+        boundary -= 1
+    if boundary <= 1:
+        return
+
+    lines = []
+    for m in messages[1:boundary]:
+        content = m.get("content")
+        if isinstance(content, str) and content.startswith(_SUMMARY_MARK):
+            # The previous rolling summary carries the whole older session;
+            # clipping it like an ordinary turn would collapse long-session
+            # memory to ~200 characters per compaction.
+            lines.append(content)
+        elif content:
+            lines.append(f"{m['role']}: {content[:200]}")
+        elif m.get("tool_calls"):
+            names = ", ".join(t["function"]["name"] for t in m["tool_calls"])
+            lines.append(f"assistant: [called tools: {names}]")
+    digest = "\n".join(lines)
+
+    summary = await _summarize(client, digest) or digest
+    if DEBUG:
+        console.print(f"[debug] compacted {boundary - 1} messages into summary",
+                      style="dim")
+    replacement = {
+        "role": "system",
+        "content": _SUMMARY_MARK + "\n" + summary,
+    }
+    messages[1:boundary] = [replacement]
+    _serialized[1:boundary] = [orjson.dumps(replacement)]
 
 # ---------------------------------------------------------------------------
 # Main entry point
 # ---------------------------------------------------------------------------
 
-def main():
-    if not check_image():
-        build_image()
+# LM Studio's models listing lives next to the chat-completions endpoint; a
+# cheap GET there opens the keep-alive connection before the first real turn.
+_MODELS_URL = LMSTUDIO_URL.rsplit("/", 2)[0] + "/models"
 
-    start_container()
+async def _ensure_sandbox():
+    """Make sure the image exists and the container is up (worker thread)."""
+    if not await asyncio.to_thread(check_image):
+        await asyncio.to_thread(build_image)
+    await asyncio.to_thread(start_container)
 
+async def _warmup_llm(client: httpx.AsyncClient):
+    """Open the LM Studio connection while the container is booting."""
+    try:
+        await client.get(_MODELS_URL)
+    except Exception:
+        pass  # server not up yet – the first real call will connect
+
+async def _bootstrap_then_chat():
+    async with httpx.AsyncClient(timeout=timeout_prefs, limits=limits_prefs,
+                                 http2=True) as client:
+        # Container bring-up and LLM connection warmup are independent;
+        # overlap them instead of paying their latencies back to back.
+        await asyncio.gather(_ensure_sandbox(), _warmup_llm(client))
+        await chat_loop(client)
+
+def main():
+    # libuv-backed event loop when available – cheaper socket polling and
+    # callback scheduling for the streaming reads and thread handoffs that
+    # dominate each turn.  Purely optional: the stock loop works the same.
     try:
-        import asyncio
-        asyncio.run(chat_loop())
-    finally:
-        stop_container()
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    # Best-effort teardown off the critical path – runs even on crashes.
+    atexit.register(stop_container)
+    asyncio.run(_bootstrap_then_chat())
 
 if __name__ == "__main__":
     main()